@@ -0,0 +1,166 @@
+import threading
+import warnings
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import db, Student, get_data_version, bump_data_version
+
+MARKS_VERSION = 'marks'
+# Student columns that feed the analytics; a change to any of them invalidates the cache.
+MARKS_FIELDS = ('marks', 'historical_marks', 'attendance', 'class_id')
+PERCENTILES = (25, 50, 75, 90)
+
+# Cached results keyed by scope ('school' or a class id), stored as (marks version, result)
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_marks_version(session, flush_context):
+    """Bumps the marks version whenever a flush adds, removes or edits a student's marks."""
+    for obj in session.new | session.deleted:
+        if isinstance(obj, Student):
+            bump_data_version(session, MARKS_VERSION)
+            return
+    for obj in session.dirty:
+        if isinstance(obj, Student):
+            state = db.inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in MARKS_FIELDS):
+                bump_data_version(session, MARKS_VERSION)
+                return
+
+
+def load_cohort(class_id=None):
+    """Loads a class's (or the school's) marks into columnar arrays with a single query.
+
+    Returns a dict with:
+      subjects   - sorted list of subject names
+      marks      - (students, subjects) float array, NaN where a subject is missing
+      attendance - (students,) float array, NaN where unknown
+      history    - (students, subjects, terms) float array of historical marks, NaN padded
+    """
+    query = db.select(Student.attendance, Student.marks, Student.historical_marks)
+    if class_id is not None:
+        query = query.where(Student.class_id == class_id)
+    rows = db.session.execute(query).all()
+    return build_cohort(rows)
+
+
+def build_cohort(rows):
+    """Packs (attendance, marks, historical_marks) rows into the arrays described in load_cohort."""
+    # A subject may only appear in the history (e.g. dropped this term), so take the union
+    subjects = sorted({subject for _, marks, history in rows for subject in {**(marks or {}), **(history or {})}})
+    column = {subject: i for i, subject in enumerate(subjects)}
+    terms = max((len(series) for _, _, history in rows for series in (history or {}).values()), default=0)
+
+    marks_arr = np.full((len(rows), len(subjects)), np.nan)
+    attendance_arr = np.full(len(rows), np.nan)
+    history_arr = np.full((len(rows), len(subjects), terms), np.nan)
+
+    for i, (attendance, marks, history) in enumerate(rows):
+        if attendance is not None:
+            attendance_arr[i] = attendance
+        for subject, score in (marks or {}).items():
+            marks_arr[i, column[subject]] = score
+        for subject, series in (history or {}).items():
+            if series:
+                history_arr[i, column[subject], :len(series)] = series
+
+    return {"subjects": subjects, "marks": marks_arr, "attendance": attendance_arr, "history": history_arr}
+
+
+def _to_json(value):
+    """Converts a NumPy scalar to a JSON-friendly float, mapping NaN to None."""
+    value = float(value)
+    return None if np.isnan(value) else round(value, 2)
+
+
+def _percentile_dict(values):
+    return {f"p{p}": _to_json(v) for p, v in zip(PERCENTILES, values)}
+
+
+def compute_cohort_stats(cohort):
+    """Computes subject averages, percentiles, attendance correlation and trends for a cohort."""
+    subjects = cohort['subjects']
+    marks = cohort['marks']
+    attendance = cohort['attendance']
+    history = cohort['history']
+
+    # Empty slices (e.g. a subject nobody has marks for) are expected and map to None
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+
+        subject_avg = np.nanmean(marks, axis=0) if marks.size else np.full(len(subjects), np.nan)
+        student_avg = np.nanmean(marks, axis=1) if marks.size else np.full(len(marks), np.nan)
+
+        if marks.size:
+            subject_pct = np.nanpercentile(marks, PERCENTILES, axis=0)
+        else:
+            subject_pct = np.full((len(PERCENTILES), len(subjects)), np.nan)
+        valid_avg = student_avg[~np.isnan(student_avg)]
+        overall_pct = np.percentile(valid_avg, PERCENTILES) if valid_avg.size else [np.nan] * len(PERCENTILES)
+
+        # Pearson correlation between attendance and each student's average score
+        mask = ~np.isnan(attendance) & ~np.isnan(student_avg)
+        correlation = np.nan
+        if mask.sum() >= 2:
+            x, y = attendance[mask], student_avg[mask]
+            if x.std() > 0 and y.std() > 0:
+                correlation = np.corrcoef(x, y)[0, 1]
+
+        # Per-series least-squares slope and first-to-last improvement, averaged per subject
+        observed = ~np.isnan(history)
+        counts = observed.sum(axis=2)
+        term_idx = np.arange(history.shape[2], dtype=float)
+        t_mean = np.where(observed, term_idx, 0).sum(axis=2) / counts
+        y_mean = np.nansum(history, axis=2) / counts
+        t_dev = np.where(observed, term_idx - t_mean[..., None], 0)
+        y_dev = np.where(observed, history - y_mean[..., None], 0)
+        slopes = (t_dev * y_dev).sum(axis=2) / (t_dev ** 2).sum(axis=2)
+
+        # Series may have gaps, so take the first and last observed terms rather than the ends
+        if history.shape[2]:
+            first_idx = observed.argmax(axis=2)[..., None]
+            last_idx = (history.shape[2] - 1 - observed[..., ::-1].argmax(axis=2))[..., None]
+            first = np.take_along_axis(history, first_idx, axis=2)[..., 0]
+            last = np.take_along_axis(history, last_idx, axis=2)[..., 0]
+        else:
+            first = last = np.full(counts.shape, np.nan)
+        improvement = np.where(counts >= 2, last - first, np.nan)
+
+        term_avg = np.nanmean(history, axis=0) if history.shape[0] else np.full(history.shape[1:], np.nan)
+        subject_slope = np.nanmean(slopes, axis=0) if slopes.size else np.full(len(subjects), np.nan)
+        subject_improvement = np.nanmean(improvement, axis=0) if improvement.size else np.full(len(subjects), np.nan)
+
+    return {
+        "students": int(marks.shape[0]),
+        "subjects": subjects,
+        "subjectAverages": {s: _to_json(subject_avg[i]) for i, s in enumerate(subjects)},
+        "subjectPercentiles": {s: _percentile_dict(subject_pct[:, i]) for i, s in enumerate(subjects)},
+        "overallPercentiles": _percentile_dict(overall_pct),
+        "attendanceScoreCorrelation": _to_json(correlation),
+        "trends": {
+            s: {
+                "termAverages": [_to_json(v) for v in term_avg[i]],
+                "averageImprovement": _to_json(subject_improvement[i]),
+                "slopePerTerm": _to_json(subject_slope[i])
+            }
+            for i, s in enumerate(subjects)
+        }
+    }
+
+
+def get_cohort_stats(class_id=None):
+    """Returns cohort statistics for a class (or the school), cached until the marks version changes."""
+    key = 'school' if class_id is None else class_id
+    version = get_data_version(MARKS_VERSION)
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    result = compute_cohort_stats(load_cohort(class_id))
+    result['version'] = version
+    with _cache_lock:
+        _cache[key] = (version, result)
+    return result
@@ -1,6 +1,6 @@
 import os
 import logging
-from flask import Flask, jsonify, request, redirect, url_for, send_from_directory
+from flask import Flask, jsonify, request, redirect, url_for, send_from_directory, send_file
 from flask_cors import CORS
 from dotenv import load_dotenv
 import requests
@@ -9,10 +9,16 @@ from flask_admin.contrib.sqla import ModelView
 from flask_login import LoginManager, UserMixin, login_user, logout_user, current_user
 from wtforms.fields import TextAreaField, PasswordField
 from markupsafe import Markup
+from sqlalchemy.orm import selectinload
 import json
 
 # Import the database object and models from models.py
-from models import db, Teacher, Student, Parent, Admin, Class, Doubt, Complaint, QuizAttempt
+from models import db, Teacher, Student, Parent, Admin, Class, Doubt, Complaint, QuizAttempt, ReportJob, Job
+from archive import get_archived_quiz_history, get_archived_complaints, period_bounds, ensure_hot_indexes
+from reports import start_report_job, reclaim_stale_report_jobs, REPORT_FORMATS
+from analytics import get_cohort_stats
+from relations import get_relation_graph
+from jobs import task, enqueue, start_worker, PermanentJobError, JOB_WORKER_INPROCESS
 
 # Load environment variables from .env file
 load_dotenv()
@@ -196,9 +202,12 @@ admin.add_view(QuizAttemptModelView(QuizAttempt, db.session))
 
 
 # --- Helper Functions ---
-def get_student_details(student):
-    """A helper to get full student details, including calculated fields."""
-    student_dict = student.to_dict()
+def get_student_details(student, quizzes_taken=None):
+    """A helper to get full student details, including calculated fields.
+
+    Batch callers can pass a precomputed `quizzes_taken` count to skip the per-student query.
+    """
+    student_dict = student.to_dict(parent_ids=get_relation_graph().parent_ids(student.id))
     marks = student_dict.get('marks', {})
     
     if marks:
@@ -213,11 +222,66 @@ def get_student_details(student):
         student_dict['lowestSubject'] = {"subject": "N/A", "score": 0}
         student_dict['highestSubject'] = {"subject": "N/A", "score": 0}
         
-    # Get the number of quizzes taken
-    student_dict['quizzesTaken'] = student.quiz_attempts.count()
+    # Get the number of quizzes taken, including those already moved to the archive
+    if quizzes_taken is None:
+        quizzes_taken = student.quiz_attempts.count()
+    archived_quizzes = student.archive_summary.quiz_attempts if student.archive_summary else 0
+    student_dict['quizzesTaken'] = quizzes_taken + archived_quizzes
 
     return student_dict
 
+# --- Background Tasks ---
+# These run on the job worker (see jobs.py), not inside the request that queued them.
+@task('send_complaint')
+def send_complaint_task(teacher_id, student_id, parent_id, remark):
+    """Snapshots the student's performance report and stores the complaint for the parent."""
+    student = db.session.get(Student, student_id)
+    if not student:
+        raise PermanentJobError("Student not found.")
+
+    new_complaint = Complaint(
+        teacher_id=teacher_id,
+        student_id=student_id,
+        parent_id=parent_id,
+        report_content=get_student_details(student),
+        teacher_remark=remark
+    )
+    db.session.add(new_complaint)
+    db.session.commit()
+    return {"complaint_id": new_complaint.id}
+
+# Worst case is 3 attempts x GEMINI_TIMEOUT_SECONDS plus 5 s + 10 s of backoff (about 150 s),
+# which must stay below the frontend's waitForJob timeout in renderer.js.
+GEMINI_TIMEOUT_SECONDS = 45
+# Client errors that are still worth retrying: request timeout and rate limiting.
+GEMINI_RETRYABLE_STATUSES = (408, 429)
+
+@task('gemini_generate', max_attempts=3)
+def gemini_generate_task(prompt):
+    """Calls the Gemini API. Network errors, timeouts, rate limits and server errors are retried."""
+    gemini_api_key = os.environ.get('GEMINI_API_KEY')
+    if not gemini_api_key:
+        raise PermanentJobError("API key not configured on the server.")
+
+    api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={gemini_api_key}"
+    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+
+    try:
+        response = requests.post(api_url, json=payload, timeout=GEMINI_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        app.logger.error(f"Error calling Gemini API: {e}")
+        status = e.response.status_code if e.response is not None else None
+        if status is not None and status < 500 and status not in GEMINI_RETRYABLE_STATUSES:
+            error_details = "An unknown error occurred."
+            try:
+                error_details = e.response.json()
+            except ValueError:
+                pass
+            raise PermanentJobError("Failed to communicate with the AI service.", error_details)
+        raise
+
 # --- API Endpoints ---
 # All API endpoints are prefixed with /api to distinguish them from frontend routes.
 @app.route('/api/login', methods=['POST'])
@@ -241,9 +305,13 @@ def login_api():
     user = db.session.scalar(db.select(user_model).where(user_model.username == username))
 
     if user and user.check_password(password):
-        user_data = user.to_dict()
+        graph = get_relation_graph()
         if role == 'student':
             user_data = get_student_details(user)
+        elif role == 'teacher':
+            user_data = user.to_dict(class_names=graph.class_names_for_teacher(user.id))
+        else:
+            user_data = user.to_dict(child_ids=graph.child_ids(user.id))
         return jsonify({"success": True, "user": user_data})
     
     return jsonify({"success": False, "message": "Invalid username or password"}), 401
@@ -251,7 +319,7 @@ def login_api():
 @app.route('/api/teacher/dashboard', methods=['GET'])
 def get_teacher_dashboard():
     """Provides all data needed for the teacher dashboard."""
-    students = db.session.scalars(db.select(Student)).all()
+    students = db.session.scalars(db.select(Student).options(selectinload(Student.archive_summary))).all()
     students_data = [get_student_details(s) for s in students]
     return jsonify(students_data)
 
@@ -262,8 +330,13 @@ def get_parent_children(parent_id):
     if not parent:
         return jsonify({"message": "Parent not found"}), 404
         
-    children_data = [get_student_details(child) for child in parent.children]
-    all_students = db.session.scalars(db.select(Student)).all()
+    child_ids = get_relation_graph().child_ids(parent_id)
+    children = db.session.scalars(
+        db.select(Student).where(Student.id.in_(child_ids)).order_by(Student.id)
+        .options(selectinload(Student.archive_summary))
+    ).all()
+    children_data = [get_student_details(child) for child in children]
+    all_students = db.session.scalars(db.select(Student).options(selectinload(Student.archive_summary))).all()
     topper = max(all_students, key=lambda s: float(get_student_details(s).get('overallAverage', 0)))
     
     return jsonify({ "children": children_data, "topper": get_student_details(topper) })
@@ -357,14 +430,15 @@ def get_student_teachers():
     if not student or not student.class_obj:
         return jsonify({"success": False, "message": "Student or class not found."}), 404
         
-    teachers = student.class_obj.teachers
-    return jsonify({"success": True, "teachers": [t.to_dict() for t in teachers]})
+    graph = get_relation_graph()
+    teacher_ids = graph.teacher_ids_for_student(student.id)
+    teachers = db.session.scalars(db.select(Teacher).where(Teacher.id.in_(teacher_ids)).order_by(Teacher.id)).all()
+    return jsonify({"success": True, "teachers": [t.to_dict(class_names=graph.class_names_for_teacher(t.id)) for t in teachers]})
 
 @app.route('/api/gemini-proxy', methods=['POST'])
 def gemini_proxy():
-    """A secure proxy for the Gemini API."""
-    gemini_api_key = os.environ.get('GEMINI_API_KEY')
-    if not gemini_api_key:
+    """A secure proxy for the Gemini API. Queues the call and returns a job to poll."""
+    if not os.environ.get('GEMINI_API_KEY'):
         return jsonify({"error": "API key not configured on the server."}), 500
 
     data = request.get_json()
@@ -372,21 +446,8 @@ def gemini_proxy():
     if not prompt:
         return jsonify({"error": "No prompt provided."}), 400
 
-    api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={gemini_api_key}"
-    payload = {"contents": [{"parts": [{"text": prompt}]}]}
-
-    try:
-        response = requests.post(api_url, json=payload)
-        response.raise_for_status()
-        return jsonify(response.json())
-    except requests.exceptions.RequestException as e:
-        app.logger.error(f"Error calling Gemini API: {e}")
-        error_details = "An unknown error occurred."
-        try:
-            error_details = e.response.json()
-        except (ValueError, AttributeError):
-            pass
-        return jsonify({"error": "Failed to communicate with the AI service.", "details": error_details}), 502
+    job = enqueue(app, 'gemini_generate', prompt=prompt)
+    return jsonify({"success": True, "job": job.to_dict()}), 202
 
 @app.route('/api/parent/complaints/<parent_id>', methods=['GET'])
 def get_parent_complaints(parent_id):
@@ -394,8 +455,24 @@ def get_parent_complaints(parent_id):
     if not parent:
         return jsonify({"success": False, "message": "Parent not found."}), 404
         
-    complaints = db.session.query(Complaint).filter(Complaint.parent_id == parent_id).order_by(Complaint.created_at.desc()).all()
-    return jsonify({"success": True, "complaints": [c.to_dict() for c in complaints]})
+    # An optional ?period=YYYY-MM limits both live and archived complaints to that month
+    period = request.args.get('period')
+    query = db.session.query(Complaint).filter(Complaint.parent_id == parent_id)
+    if period:
+        try:
+            start, end = period_bounds(period)
+        except ValueError:
+            return jsonify({"success": False, "message": "Period must be in YYYY-MM format."}), 400
+        query = query.filter(Complaint.created_at >= start, Complaint.created_at < end)
+    complaints = query.order_by(Complaint.created_at.desc()).all()
+    complaints_data = [c.to_dict() for c in complaints]
+
+    # Archived complaints are only read when explicitly asked for
+    if request.args.get('include_archived') == 'true':
+        archived = get_archived_complaints(parent_id, period)
+        complaints_data.extend(c.to_dict() for c in archived)
+
+    return jsonify({"success": True, "complaints": complaints_data})
 
 @app.route('/api/teacher/complaint', methods=['POST'])
 def create_complaint():
@@ -408,27 +485,19 @@ def create_complaint():
         return jsonify({"success": False, "message": "Missing required fields."}), 400
 
     student = db.session.get(Student, student_id)
-    if not student or not student.parents:
+    parent_ids = get_relation_graph().parent_ids(student_id)
+    if not student or not parent_ids:
         return jsonify({"success": False, "message": "Student or linked parent not found."}), 404
         
     # For simplicity, we send the complaint to the first linked parent.
     # A real-world app might handle multiple parents differently.
-    parent_id = student.parents[0].id
+    parent_id = parent_ids[0]
     
-    # Generate the performance report content
-    report_content = get_student_details(student)
-
-    new_complaint = Complaint(
-        teacher_id=teacher_id,
-        student_id=student_id,
-        parent_id=parent_id,
-        report_content=report_content,
-        teacher_remark=remark
-    )
-    db.session.add(new_complaint)
-    db.session.commit()
+    # The performance report snapshot is built in the background
+    job = enqueue(app, 'send_complaint', teacher_id=teacher_id, student_id=student_id,
+                  parent_id=parent_id, remark=remark)
 
-    return jsonify({"success": True, "message": "Complaint sent to parent successfully."})
+    return jsonify({"success": True, "message": "Complaint queued for delivery to the parent.", "job": job.to_dict()}), 202
 
 @app.route('/api/student/quiz/attempt', methods=['POST'])
 def save_quiz_attempt():
@@ -463,8 +532,90 @@ def get_quiz_history(student_id):
     if not student:
         return jsonify({"success": False, "message": "Student not found."}), 404
 
-    attempts = student.quiz_attempts.order_by(QuizAttempt.attempted_at.desc()).all()
-    return jsonify({"success": True, "history": [attempt.to_dict() for attempt in attempts]})
+    # An optional ?period=YYYY-MM limits both live and archived attempts to that month
+    period = request.args.get('period')
+    query = student.quiz_attempts
+    if period:
+        try:
+            start, end = period_bounds(period)
+        except ValueError:
+            return jsonify({"success": False, "message": "Period must be in YYYY-MM format."}), 400
+        query = query.filter(QuizAttempt.attempted_at >= start, QuizAttempt.attempted_at < end)
+    attempts = query.order_by(QuizAttempt.attempted_at.desc()).all()
+    history = [attempt.to_dict() for attempt in attempts]
+
+    # Archived attempts are only read when explicitly asked for
+    if request.args.get('include_archived') == 'true':
+        archived = get_archived_quiz_history(student_id, period)
+        history.extend(attempt.to_dict() for attempt in archived)
+
+    return jsonify({"success": True, "history": history})
+
+@app.route('/api/reports/batch', methods=['POST'])
+def create_report_job():
+    """Starts a batch report run for one class (class_id) or the whole school."""
+    data = request.get_json() or {}
+    class_id = data.get('class_id')
+    output_format = data.get('format', 'jsonl')
+
+    if output_format not in REPORT_FORMATS:
+        return jsonify({"success": False, "message": "Format must be one of: " + ", ".join(REPORT_FORMATS)}), 400
+    if class_id is not None and not db.session.get(Class, class_id):
+        return jsonify({"success": False, "message": "Class not found."}), 404
+
+    job = start_report_job(app, class_id=class_id, output_format=output_format)
+    return jsonify({"success": True, "job": job.to_dict()}), 202
+
+@app.route('/api/reports/jobs/<job_id>', methods=['GET'])
+def get_report_job(job_id):
+    reclaim_stale_report_jobs()
+    job = db.session.get(ReportJob, job_id)
+    if not job:
+        return jsonify({"success": False, "message": "Report job not found."}), 404
+    return jsonify({"success": True, "job": job.to_dict()})
+
+@app.route('/api/reports/jobs/<job_id>/download', methods=['GET'])
+def download_report_job(job_id):
+    job = db.session.get(ReportJob, job_id)
+    if not job:
+        return jsonify({"success": False, "message": "Report job not found."}), 404
+    if job.status != 'succeeded':
+        return jsonify({"success": False, "message": "Report is not ready yet.", "job": job.to_dict()}), 409
+
+    mimetype = 'text/csv' if job.output_format == 'csv' else 'application/x-ndjson'
+    return send_file(job.output_path, mimetype=mimetype, as_attachment=True,
+                     download_name=f"reports-{job_id}.{job.output_format}")
+
+@app.route('/api/analytics/school', methods=['GET'])
+def get_school_analytics():
+    """Provides cohort statistics across every student in the school."""
+    return jsonify({"success": True, "analytics": get_cohort_stats()})
+
+@app.route('/api/analytics/class/<int:class_id>', methods=['GET'])
+def get_class_analytics(class_id):
+    """Provides cohort statistics for a single class."""
+    class_obj = db.session.get(Class, class_id)
+    if not class_obj:
+        return jsonify({"success": False, "message": "Class not found."}), 404
+    analytics = get_cohort_stats(class_id)
+    return jsonify({"success": True, "class_name": class_obj.name, "analytics": analytics})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = db.session.get(Job, job_id)
+    if not job:
+        return jsonify({"success": False, "message": "Job not found."}), 404
+    return jsonify({"success": True, "job": job.to_dict()})
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """Lists the most recent jobs, optionally filtered by ?status=queued|running|succeeded|failed."""
+    query = db.select(Job).order_by(Job.created_at.desc()).limit(100)
+    status = request.args.get('status')
+    if status:
+        query = query.where(Job.status == status)
+    jobs = db.session.scalars(query).all()
+    return jsonify({"success": True, "jobs": [j.to_dict() for j in jobs]})
 
 # --- Catch-all route for Frontend ---
 # This route serves the frontend's index.html for any path not handled by the API or Admin panel.
@@ -481,5 +632,9 @@ if __name__ == '__main__':
     with app.app_context():
         # This ensures the database is created if it doesn't exist
         db.create_all()
+        ensure_hot_indexes()
+    # Only the reloader's child process serves requests (and reloads on edits), so run jobs there
+    if JOB_WORKER_INPROCESS and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_worker(app)
     app.logger.info("Starting Flask server in debug mode.")
     app.run(debug=True, port=8000)
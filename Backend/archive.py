@@ -0,0 +1,158 @@
+import os
+import argparse
+import datetime
+from models import db, Complaint, QuizAttempt, QuizAttemptArchive, ComplaintArchive, ArchiveSummary
+
+# Rows older than this many days are moved out of the hot tables.
+DEFAULT_HORIZON_DAYS = int(os.environ.get('ARCHIVE_HORIZON_DAYS', 365))
+# Rows are moved in batches so a single run never holds a long write lock.
+BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 500))
+
+
+def _period(timestamp):
+    """Returns the monthly partition key ('YYYY-MM') for a timestamp."""
+    return timestamp.strftime('%Y-%m')
+
+
+def period_bounds(period):
+    """Returns the [start, end) datetimes of a 'YYYY-MM' period. Raises ValueError if malformed."""
+    start = datetime.datetime.strptime(period, '%Y-%m')
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start, end
+
+
+def ensure_hot_indexes():
+    """Creates the live tables' hot-path indexes on databases built before they were declared.
+
+    db.create_all() never alters existing tables, so this issues CREATE INDEX IF NOT EXISTS instead.
+    """
+    for table in (QuizAttempt.__table__, Complaint.__table__):
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+
+def _get_summary(summaries, student_id):
+    """Fetches (or creates) the ArchiveSummary row for a student, cached for this batch."""
+    summary = summaries.get(student_id)
+    if summary is None:
+        summary = db.session.get(ArchiveSummary, student_id)
+        if summary is None:
+            summary = ArchiveSummary(student_id=student_id, quiz_attempts=0)
+            db.session.add(summary)
+        summaries[student_id] = summary
+    return summary
+
+
+def archive_quiz_attempts(cutoff, batch_size=BATCH_SIZE):
+    """Moves quiz attempts made before `cutoff` into the archive table. Returns the number moved."""
+    moved = 0
+    while True:
+        attempts = db.session.scalars(
+            db.select(QuizAttempt)
+            .where(QuizAttempt.attempted_at < cutoff)
+            .order_by(QuizAttempt.id)
+            .limit(batch_size)
+        ).all()
+        if not attempts:
+            break
+
+        now = datetime.datetime.utcnow()
+        summaries = {}
+        for attempt in attempts:
+            db.session.add(QuizAttemptArchive(
+                source_id=attempt.id,
+                student_id=attempt.student_id,
+                period=_period(attempt.attempted_at),
+                subject=attempt.subject,
+                score=attempt.score,
+                total_questions=attempt.total_questions,
+                accuracy=attempt.accuracy,
+                time_taken_seconds=attempt.time_taken_seconds,
+                details=attempt.details,
+                attempted_at=attempt.attempted_at
+            ))
+            summary = _get_summary(summaries, attempt.student_id)
+            summary.quiz_attempts += 1
+            summary.last_archived_at = now
+            db.session.delete(attempt)
+
+        db.session.commit()
+        moved += len(attempts)
+    return moved
+
+
+def archive_complaints(cutoff, batch_size=BATCH_SIZE):
+    """Moves complaints created before `cutoff` into the archive table. Returns the number moved."""
+    moved = 0
+    while True:
+        complaints = db.session.scalars(
+            db.select(Complaint)
+            .where(Complaint.created_at < cutoff)
+            .order_by(Complaint.id)
+            .limit(batch_size)
+        ).all()
+        if not complaints:
+            break
+
+        for complaint in complaints:
+            db.session.add(ComplaintArchive(
+                source_id=complaint.id,
+                teacher_id=complaint.teacher_id,
+                student_id=complaint.student_id,
+                parent_id=complaint.parent_id,
+                period=_period(complaint.created_at),
+                report_content=complaint.report_content,
+                teacher_remark=complaint.teacher_remark,
+                created_at=complaint.created_at
+            ))
+            db.session.delete(complaint)
+
+        db.session.commit()
+        moved += len(complaints)
+    return moved
+
+
+def run_archival(horizon_days=DEFAULT_HORIZON_DAYS):
+    """Archives all quiz attempts and complaints older than `horizon_days`."""
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=horizon_days)
+    return {
+        "cutoff": cutoff.isoformat(),
+        "quiz_attempts": archive_quiz_attempts(cutoff),
+        "complaints": archive_complaints(cutoff)
+    }
+
+
+def get_archived_quiz_history(student_id, period=None):
+    """Reads a student's archived quiz attempts, newest first, optionally for a single period."""
+    query = db.select(QuizAttemptArchive).where(QuizAttemptArchive.student_id == student_id)
+    if period:
+        query = query.where(QuizAttemptArchive.period == period)
+    return db.session.scalars(query.order_by(QuizAttemptArchive.attempted_at.desc())).all()
+
+
+def get_archived_complaints(parent_id, period=None):
+    """Reads a parent's archived complaints, newest first, optionally for a single period."""
+    query = db.select(ComplaintArchive).where(ComplaintArchive.parent_id == parent_id)
+    if period:
+        query = query.where(ComplaintArchive.period == period)
+    return db.session.scalars(query.order_by(ComplaintArchive.created_at.desc())).all()
+
+
+if __name__ == '__main__':
+    from app import app
+
+    parser = argparse.ArgumentParser(description="Archive old quiz attempts and complaints.")
+    parser.add_argument('--days', type=int, default=DEFAULT_HORIZON_DAYS,
+                        help="Archive rows older than this many days.")
+    args = parser.parse_args()
+
+    with app.app_context():
+        # Make sure the archive tables and hot-path indexes exist before moving anything
+        db.create_all()
+        ensure_hot_indexes()
+        result = run_archival(args.days)
+        print(f"Archived {result['quiz_attempts']} quiz attempts and {result['complaints']} complaints "
+              f"older than {result['cutoff']}.")
@@ -0,0 +1,74 @@
+import time
+import random
+import argparse
+import statistics
+from analytics import build_cohort, compute_cohort_stats
+
+SUBJECTS = ['Math', 'Science', 'English', 'History', 'Arts']
+
+
+def make_rows(n_students, n_terms, seed=42):
+    """Generates synthetic (attendance, marks, historical_marks) rows shaped like Student records."""
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n_students):
+        history = {s: [rng.randint(40, 100) for _ in range(n_terms)] for s in SUBJECTS}
+        marks = {s: series[-1] for s, series in history.items()}
+        rows.append((rng.randint(50, 100), marks, history))
+    return rows
+
+
+def naive_stats(rows):
+    """The per-student Python loop the frontend effectively runs today."""
+    subjects = sorted({s for _, marks, _ in rows for s in marks})
+    result = {"subjectAverages": {}, "subjectPercentiles": {}, "trends": {}}
+    for subject in subjects:
+        scores = [marks[subject] for _, marks, _ in rows if subject in marks]
+        result["subjectAverages"][subject] = sum(scores) / len(scores)
+        quantiles = statistics.quantiles(scores, n=100, method='inclusive')
+        result["subjectPercentiles"][subject] = {f"p{p}": quantiles[p - 1] for p in (25, 50, 75, 90)}
+
+        improvements = []
+        slopes = []
+        for _, _, history in rows:
+            series = history.get(subject) or []
+            if len(series) >= 2:
+                improvements.append(series[-1] - series[0])
+                slopes.append(statistics.linear_regression(range(len(series)), series).slope)
+        result["trends"][subject] = {
+            "averageImprovement": sum(improvements) / len(improvements) if improvements else None,
+            "slopePerTerm": sum(slopes) / len(slopes) if slopes else None
+        }
+
+    averages = [sum(marks.values()) / len(marks) for _, marks, _ in rows if marks]
+    attendance = [a for a, marks, _ in rows if marks]
+    result["attendanceScoreCorrelation"] = statistics.correlation(attendance, averages)
+    return result
+
+
+def bench(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark vectorized cohort analytics against a naive loop.")
+    parser.add_argument('--students', type=int, default=10000)
+    parser.add_argument('--terms', type=int, default=6)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rows = make_rows(args.students, args.terms)
+    naive = bench(lambda: naive_stats(rows), args.repeat)
+    vectorized = bench(lambda: compute_cohort_stats(build_cohort(rows)), args.repeat)
+    compute_only_cohort = build_cohort(rows)
+    compute_only = bench(lambda: compute_cohort_stats(compute_only_cohort), args.repeat)
+
+    print(f"{args.students} students x {len(SUBJECTS)} subjects x {args.terms} terms (best of {args.repeat})")
+    print(f"  naive loop:              {naive * 1000:8.1f} ms")
+    print(f"  vectorized (incl. pack): {vectorized * 1000:8.1f} ms  ({naive / vectorized:.1f}x)")
+    print(f"  vectorized (compute):    {compute_only * 1000:8.1f} ms  ({naive / compute_only:.1f}x)")
@@ -0,0 +1,9 @@
+# Gunicorn loads this file automatically when started from the Backend directory.
+
+
+def post_fork(server, worker):
+    """Starts the background job worker in every web worker process after it is forked."""
+    from jobs import start_worker, JOB_WORKER_INPROCESS
+    if JOB_WORKER_INPROCESS:
+        from app import app
+        start_worker(app)
@@ -0,0 +1,226 @@
+import os
+import uuid
+import socket
+import argparse
+import datetime
+import threading
+from models import db, Job
+
+# Worker threads per process; this is the concurrency limit for background work.
+JOB_CONCURRENCY = int(os.environ.get('JOB_CONCURRENCY', 2))
+# Set to 0 when jobs are handled by a separate `python jobs.py` process. The web entrypoints
+# (app.py's __main__ block and gunicorn.conf.py's post_fork hook) start the worker when this is 1.
+JOB_WORKER_INPROCESS = os.environ.get('JOB_WORKER_INPROCESS', '1') == '1'
+# How long an idle worker waits before polling the queue again.
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', 1))
+# A job running longer than this is assumed to belong to a dead worker and is reclaimed.
+JOB_TIMEOUT_SECONDS = int(os.environ.get('JOB_TIMEOUT_SECONDS', 300))
+# Base delay before a failed job is retried; doubles with every attempt.
+JOB_RETRY_BACKOFF_SECONDS = int(os.environ.get('JOB_RETRY_BACKOFF_SECONDS', 5))
+
+# Registered task functions, keyed by name
+TASKS = {}
+DEFAULT_MAX_ATTEMPTS = {}
+
+_worker = None
+_worker_lock = threading.Lock()
+# When stale running jobs were last reclaimed; checked on a timer, not on every poll
+_last_reclaim = None
+_reclaim_lock = threading.Lock()
+
+
+class PermanentJobError(Exception):
+    """Raised by a task to fail its job straight away, without retrying."""
+    def __init__(self, message, details=None):
+        super().__init__(message)
+        self.details = details
+
+
+def task(name, max_attempts=3):
+    """Registers a function as a background task that can be enqueued by name."""
+    def decorator(fn):
+        TASKS[name] = fn
+        DEFAULT_MAX_ATTEMPTS[name] = max_attempts
+        return fn
+    return decorator
+
+
+def enqueue(app, name, **payload):
+    """Queues a registered task and returns its Job without waiting for it to run."""
+    if name not in TASKS:
+        raise ValueError(f"Unknown task: {name}")
+    job = Job(
+        id=uuid.uuid4().hex,
+        name=name,
+        payload=payload,
+        status='queued',
+        max_attempts=DEFAULT_MAX_ATTEMPTS[name],
+        run_after=datetime.datetime.utcnow()
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    # Let an idle in-process worker pick the job up without waiting for its next poll
+    if _worker is not None:
+        _worker.wake()
+    return job
+
+
+def _reclaim_stale_jobs(now):
+    """Requeues (or fails, if out of attempts) jobs whose worker stopped responding."""
+    cutoff = now - datetime.timedelta(seconds=JOB_TIMEOUT_SECONDS)
+    stale = (Job.status == 'running') & (Job.started_at < cutoff)
+    db.session.execute(
+        db.update(Job).where(stale, Job.attempts < Job.max_attempts)
+        .values(status='queued', locked_by=None, run_after=now)
+    )
+    db.session.execute(
+        db.update(Job).where(stale, Job.attempts >= Job.max_attempts)
+        .values(status='failed', error='Job timed out.', finished_at=now)
+    )
+    db.session.commit()
+
+
+def _maybe_reclaim_stale_jobs(now):
+    """Reclaims stale jobs at most once every JOB_TIMEOUT_SECONDS / 10 per process."""
+    global _last_reclaim
+    interval = datetime.timedelta(seconds=JOB_TIMEOUT_SECONDS / 10)
+    with _reclaim_lock:
+        if _last_reclaim is not None and now - _last_reclaim < interval:
+            return
+        _last_reclaim = now
+    _reclaim_stale_jobs(now)
+
+
+def claim_next_job(worker_id):
+    """Atomically moves the oldest runnable job to 'running' for this worker. Returns its id or None."""
+    now = datetime.datetime.utcnow()
+    _maybe_reclaim_stale_jobs(now)
+
+    job_id = db.session.scalar(
+        db.select(Job.id)
+        .where(Job.status == 'queued', Job.run_after <= now)
+        .order_by(Job.created_at)
+        .limit(1)
+    )
+    if job_id is None:
+        return None
+
+    # The status check in the WHERE clause makes sure only one worker wins the job
+    claimed = db.session.execute(
+        db.update(Job).where(Job.id == job_id, Job.status == 'queued')
+        .values(status='running', locked_by=worker_id, started_at=now, attempts=Job.attempts + 1)
+    )
+    db.session.commit()
+    return job_id if claimed.rowcount == 1 else None
+
+
+def run_job(app, job_id):
+    """Runs a claimed job and records its result, scheduling a retry if it failed."""
+    job = db.session.get(Job, job_id)
+    fn = TASKS.get(job.name)
+    try:
+        if fn is None:
+            raise PermanentJobError(f"Unknown task: {job.name}")
+        result = fn(**job.payload)
+    except PermanentJobError as e:
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.status = 'failed'
+        job.error = str(e)
+        job.result = {"error": str(e), "details": e.details}
+        job.finished_at = datetime.datetime.utcnow()
+    except Exception as e:
+        # Roll back first: the task may have left the session unusable (e.g. a failed flush)
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        app.logger.error(f"Job {job_id} ({job.name}) failed on attempt {job.attempts}: {e}")
+        job.error = str(e)
+        if job.attempts < job.max_attempts:
+            delay = JOB_RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1)
+            job.status = 'queued'
+            job.locked_by = None
+            job.run_after = datetime.datetime.utcnow() + datetime.timedelta(seconds=delay)
+        else:
+            job.status = 'failed'
+            job.finished_at = datetime.datetime.utcnow()
+    else:
+        job.status = 'succeeded'
+        job.result = result
+        job.error = None
+        job.finished_at = datetime.datetime.utcnow()
+    db.session.commit()
+
+
+class JobWorker:
+    """A pool of threads that pull jobs from the queue, at most `concurrency` at a time."""
+
+    def __init__(self, app, concurrency=JOB_CONCURRENCY):
+        self.app = app
+        self.concurrency = concurrency
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def wake(self):
+        self._wakeup.set()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        self.join()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            job_id = None
+            try:
+                with self.app.app_context():
+                    job_id = claim_next_job(self.worker_id)
+                    if job_id:
+                        run_job(self.app, job_id)
+            except Exception as e:
+                self.app.logger.error(f"Job worker error: {e}")
+            if not job_id:
+                self._wakeup.wait(JOB_POLL_SECONDS)
+                self._wakeup.clear()
+
+
+def start_worker(app):
+    """Starts this process's worker threads (once) and returns the worker."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = JobWorker(app).start()
+    return _worker
+
+
+if __name__ == '__main__':
+    # Importing the app registers its tasks on the `jobs` module, so run the worker from there too
+    from app import app
+    import jobs
+
+    parser = argparse.ArgumentParser(description="Run background jobs outside the web process.")
+    parser.add_argument('--concurrency', type=int, default=JOB_CONCURRENCY,
+                        help="Number of jobs to run at the same time.")
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+    worker = jobs.JobWorker(app, concurrency=args.concurrency).start()
+    print(f"Job worker {worker.worker_id} started with {args.concurrency} threads.")
+    try:
+        worker.join()
+    except KeyboardInterrupt:
+        worker.stop()
@@ -3,6 +3,7 @@ from sqlalchemy.types import JSON
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 import datetime
+import uuid
 
 db = SQLAlchemy()
 
@@ -43,8 +44,10 @@ class Teacher(db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
-    def to_dict(self):
-        return {"id": self.id, "name": self.name, "username": self.username, "classes": [c.name for c in self.classes]}
+    def to_dict(self, class_names=None):
+        if class_names is None:
+            class_names = [c.name for c in self.classes]
+        return {"id": self.id, "name": self.name, "username": self.username, "classes": class_names}
 
     def __str__(self):
         return self.name
@@ -62,6 +65,8 @@ class Student(db.Model):
     parents = db.relationship('Parent', secondary='parent_student_link', back_populates='children')
     doubts = db.relationship('Doubt', back_populates='student', cascade='all, delete-orphan')
     quiz_attempts = db.relationship('QuizAttempt', back_populates='student', lazy='dynamic', cascade='all, delete-orphan')
+    archived_quiz_attempts = db.relationship('QuizAttemptArchive', back_populates='student', lazy='dynamic', cascade='all, delete-orphan')
+    archive_summary = db.relationship('ArchiveSummary', back_populates='student', uselist=False, cascade='all, delete-orphan')
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -69,13 +74,15 @@ class Student(db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
-    def to_dict(self):
+    def to_dict(self, parent_ids=None):
+        if parent_ids is None:
+            parent_ids = [p.id for p in self.parents]
         return {
             "id": self.id, "name": self.name, "username": self.username,
             "class_name": self.class_obj.name if self.class_obj else None,
             "attendance": self.attendance,
             "marks": self.marks, "historicalMarks": self.historical_marks,
-            "parentIds": [p.id for p in self.parents]
+            "parentIds": parent_ids
         }
 
     def __str__(self):
@@ -94,8 +101,10 @@ class Parent(db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
     
-    def to_dict(self):
-        return {"id": self.id, "name": self.name, "username": self.username, "children": [s.id for s in self.children]}
+    def to_dict(self, child_ids=None):
+        if child_ids is None:
+            child_ids = [s.id for s in self.children]
+        return {"id": self.id, "name": self.name, "username": self.username, "children": child_ids}
 
     def __str__(self):
         return self.name
@@ -135,13 +144,15 @@ class Doubt(db.Model):
 
 class Complaint(db.Model):
     __tablename__ = 'complaints'
+    # Never reuse ids of rows that were moved to the archive
+    __table_args__ = {'sqlite_autoincrement': True}
     id = db.Column(db.Integer, primary_key=True)
     teacher_id = db.Column(db.String(10), db.ForeignKey('teacher.id'), nullable=False)
     student_id = db.Column(db.String(10), db.ForeignKey('student.id'), nullable=False)
-    parent_id = db.Column(db.String(10), db.ForeignKey('parent.id'), nullable=False)
+    parent_id = db.Column(db.String(10), db.ForeignKey('parent.id'), nullable=False, index=True)
     report_content = db.Column(JSON, nullable=False)
     teacher_remark = db.Column(db.String, nullable=False)
-    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    created_at = db.Column(db.DateTime, server_default=db.func.now(), index=True)
 
     teacher = db.relationship('Teacher')
     student = db.relationship('Student')
@@ -162,16 +173,18 @@ class Complaint(db.Model):
 
 class QuizAttempt(db.Model):
     __tablename__ = 'quiz_attempts'
+    # Never reuse ids of rows that were moved to the archive
+    __table_args__ = {'sqlite_autoincrement': True}
     id = db.Column(db.Integer, primary_key=True)
-    student_id = db.Column(db.String(10), db.ForeignKey('student.id'), nullable=False)
+    student_id = db.Column(db.String(10), db.ForeignKey('student.id'), nullable=False, index=True)
     subject = db.Column(db.String(50), nullable=False)
     score = db.Column(db.Integer, nullable=False)
     total_questions = db.Column(db.Integer, nullable=False)
     accuracy = db.Column(db.Float, nullable=False)
     time_taken_seconds = db.Column(db.Integer, nullable=False)
     details = db.Column(JSON, nullable=False) # Store questions, answers, topics etc.
-    attempted_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
-    
+    attempted_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, index=True)
+
     student = db.relationship('Student', back_populates='quiz_attempts')
 
     def to_dict(self):
@@ -185,4 +198,163 @@ class QuizAttempt(db.Model):
             "time_taken_seconds": self.time_taken_seconds,
             "details": self.details,
             "attempted_at": self.attempted_at.isoformat()
-        }
\ No newline at end of file
+        }
+
+# --- Archive Tables ---
+# Attempts and complaints older than the archive horizon are moved here by archive.py.
+# Rows are partitioned by month ('YYYY-MM') so whole periods can be read or purged together.
+
+class QuizAttemptArchive(db.Model):
+    __tablename__ = 'quiz_attempts_archive'
+    id = db.Column(db.Integer, primary_key=True)
+    source_id = db.Column(db.Integer, nullable=False, index=True) # The original QuizAttempt id
+    student_id = db.Column(db.String(10), db.ForeignKey('student.id'), nullable=False, index=True)
+    period = db.Column(db.String(7), nullable=False, index=True)
+    subject = db.Column(db.String(50), nullable=False)
+    score = db.Column(db.Integer, nullable=False)
+    total_questions = db.Column(db.Integer, nullable=False)
+    accuracy = db.Column(db.Float, nullable=False)
+    time_taken_seconds = db.Column(db.Integer, nullable=False)
+    details = db.Column(JSON, nullable=False)
+    attempted_at = db.Column(db.DateTime, nullable=False)
+
+    student = db.relationship('Student', back_populates='archived_quiz_attempts')
+
+    def to_dict(self):
+        return {
+            "id": self.source_id,
+            "archive_id": self.id,
+            "student_id": self.student_id,
+            "subject": self.subject,
+            "score": self.score,
+            "total_questions": self.total_questions,
+            "accuracy": self.accuracy,
+            "time_taken_seconds": self.time_taken_seconds,
+            "details": self.details,
+            "attempted_at": self.attempted_at.isoformat(),
+            "archived": True
+        }
+
+class ComplaintArchive(db.Model):
+    __tablename__ = 'complaints_archive'
+    id = db.Column(db.Integer, primary_key=True)
+    source_id = db.Column(db.Integer, nullable=False, index=True) # The original Complaint id
+    teacher_id = db.Column(db.String(10), db.ForeignKey('teacher.id'), nullable=False)
+    student_id = db.Column(db.String(10), db.ForeignKey('student.id'), nullable=False)
+    parent_id = db.Column(db.String(10), db.ForeignKey('parent.id'), nullable=False, index=True)
+    period = db.Column(db.String(7), nullable=False, index=True)
+    report_content = db.Column(JSON, nullable=False)
+    teacher_remark = db.Column(db.String, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+    teacher = db.relationship('Teacher')
+    student = db.relationship('Student')
+    parent = db.relationship('Parent')
+
+    def to_dict(self):
+        return {
+            "id": self.source_id,
+            "archive_id": self.id,
+            "teacher_id": self.teacher_id,
+            "teacher_name": self.teacher.name,
+            "student_id": self.student_id,
+            "student_name": self.student.name,
+            "parent_id": self.parent_id,
+            "report_content": self.report_content,
+            "teacher_remark": self.teacher_remark,
+            "created_at": self.created_at.isoformat(),
+            "archived": True
+        }
+
+class ArchiveSummary(db.Model):
+    """Rolled-up counters for a student's archived rows, so live summaries stay accurate."""
+    __tablename__ = 'archive_summaries'
+    student_id = db.Column(db.String(10), db.ForeignKey('student.id'), primary_key=True)
+    quiz_attempts = db.Column(db.Integer, default=0, nullable=False) # Feeds quizzesTaken
+    last_archived_at = db.Column(db.DateTime)
+
+    student = db.relationship('Student', back_populates='archive_summary')
+
+class ReportJob(db.Model):
+    """Tracks a batch report run so any web worker can report its progress."""
+    __tablename__ = 'report_jobs'
+    id = db.Column(db.String(32), primary_key=True)
+    class_id = db.Column(db.Integer, db.ForeignKey('class.id'), nullable=True) # None means the whole school
+    output_format = db.Column(db.String(10), nullable=False, default='jsonl')
+    status = db.Column(db.String(20), nullable=False, default='queued') # queued, running, succeeded, failed
+    total_classes = db.Column(db.Integer, default=0, nullable=False)
+    completed_classes = db.Column(db.Integer, default=0, nullable=False)
+    students_processed = db.Column(db.Integer, default=0, nullable=False)
+    output_path = db.Column(db.String(255))
+    error = db.Column(db.String)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow) # Heartbeat
+    finished_at = db.Column(db.DateTime)
+
+    class_obj = db.relationship('Class')
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "class_id": self.class_id,
+            "class_name": self.class_obj.name if self.class_obj else None,
+            "format": self.output_format,
+            "status": self.status,
+            "total_classes": self.total_classes,
+            "completed_classes": self.completed_classes,
+            "students_processed": self.students_processed,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class DataVersion(db.Model):
+    """A version token per dataset (e.g. 'marks'), changed on every write so in-process caches know when to refresh."""
+    __tablename__ = 'data_versions'
+    name = db.Column(db.String(50), primary_key=True)
+    # A random token rather than a counter: a rolled-back bump must never match a later committed one
+    version = db.Column(db.String(32), nullable=False)
+
+def get_data_version(name):
+    """Returns the current version token of a dataset, or '' if it has never been written."""
+    return db.session.scalar(db.select(DataVersion.version).where(DataVersion.name == name)) or ''
+
+def bump_data_version(session, name):
+    """Gives a dataset a fresh version token inside the given session's transaction."""
+    token = uuid.uuid4().hex
+    result = session.execute(
+        db.update(DataVersion).where(DataVersion.name == name).values(version=token)
+    )
+    if result.rowcount == 0:
+        session.execute(db.insert(DataVersion).values(name=name, version=token))
+
+class Job(db.Model):
+    """A unit of background work queued by a request handler and run by jobs.py."""
+    __tablename__ = 'jobs'
+    id = db.Column(db.String(32), primary_key=True)
+    name = db.Column(db.String(50), nullable=False) # The registered task to run
+    payload = db.Column(JSON, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True) # queued, running, succeeded, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    result = db.Column(JSON)
+    error = db.Column(db.String)
+    locked_by = db.Column(db.String(64))
+    run_after = db.Column(db.DateTime, default=datetime.datetime.utcnow, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -0,0 +1,105 @@
+import threading
+from collections import defaultdict
+from flask import g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import (db, Student, Parent, Teacher, Class, parent_student_link, teacher_class_link,
+                    get_data_version, bump_data_version)
+
+RELATIONS_VERSION = 'relations'
+# Attributes that change the parent-child or teacher-class graphs, per model.
+RELATION_FIELDS = {
+    Student: ('parents', 'class_id', 'class_obj'),
+    Parent: ('children',),
+    Teacher: ('classes',),
+    Class: ('teachers', 'students', 'name'),
+}
+
+# The process-wide graph, shared by every request until the relations version changes
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def _relations_changed(session):
+    for obj in session.new | session.deleted:
+        if type(obj) in RELATION_FIELDS:
+            return True
+    for obj in session.dirty:
+        fields = RELATION_FIELDS.get(type(obj))
+        if fields:
+            state = db.inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in fields):
+                return True
+    return False
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_relations_version(session, flush_context):
+    """Bumps the relations version whenever a flush touches the link tables or their endpoints."""
+    if _relations_changed(session):
+        bump_data_version(session, RELATIONS_VERSION)
+        # Drop the graph memoised for this request so later reads see the write
+        if has_app_context():
+            g.pop('relation_graph', None)
+
+
+class RelationGraph:
+    """An immutable snapshot of the parent-child and teacher-class adjacency lists."""
+
+    def __init__(self, version):
+        self.version = version
+        self.parent_children = defaultdict(list)
+        self.student_parents = defaultdict(list)
+        self.teacher_classes = defaultdict(list)
+        self.class_teachers = defaultdict(list)
+        self.student_class = {}
+        self.class_names = {}
+
+    @classmethod
+    def load(cls, version):
+        """Builds the graph from the link tables with one query per table, no joins."""
+        graph = cls(version)
+        for parent_id, student_id in db.session.execute(
+                db.select(parent_student_link.c.parent_id, parent_student_link.c.student_id)
+                .order_by(parent_student_link.c.parent_id, parent_student_link.c.student_id)):
+            graph.parent_children[parent_id].append(student_id)
+            graph.student_parents[student_id].append(parent_id)
+        for teacher_id, class_id in db.session.execute(
+                db.select(teacher_class_link.c.teacher_id, teacher_class_link.c.class_id)
+                .order_by(teacher_class_link.c.teacher_id, teacher_class_link.c.class_id)):
+            graph.teacher_classes[teacher_id].append(class_id)
+            graph.class_teachers[class_id].append(teacher_id)
+        graph.student_class = dict(db.session.execute(db.select(Student.id, Student.class_id)).all())
+        graph.class_names = dict(db.session.execute(db.select(Class.id, Class.name)).all())
+        return graph
+
+    def parent_ids(self, student_id):
+        return list(self.student_parents.get(student_id, ()))
+
+    def child_ids(self, parent_id):
+        return list(self.parent_children.get(parent_id, ()))
+
+    def class_names_for_teacher(self, teacher_id):
+        return [self.class_names[c] for c in self.teacher_classes.get(teacher_id, ()) if c in self.class_names]
+
+    def teacher_ids_for_student(self, student_id):
+        return list(self.class_teachers.get(self.student_class.get(student_id), ()))
+
+
+def get_relation_graph():
+    """Returns the current relation graph, checking the version at most once per request."""
+    if has_app_context() and 'relation_graph' in g:
+        return g.relation_graph
+
+    global _graph
+    version = get_data_version(RELATIONS_VERSION)
+    with _graph_lock:
+        graph = _graph
+    if graph is None or graph.version != version:
+        graph = RelationGraph.load(version)
+        with _graph_lock:
+            _graph = graph
+
+    if has_app_context():
+        g.relation_graph = graph
+    return graph
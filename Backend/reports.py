@@ -0,0 +1,177 @@
+import os
+import csv
+import json
+import uuid
+import datetime
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from sqlalchemy.orm import selectinload
+from models import db, Class, Student, QuizAttempt, ReportJob
+
+# Number of worker processes used for a batch run. Defaults to one per CPU.
+REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', os.cpu_count() or 1))
+REPORT_FORMATS = ('jsonl', 'csv')
+# A queued or running job with no heartbeat for this long is assumed to have died with its web worker.
+REPORT_TIMEOUT_SECONDS = int(os.environ.get('REPORT_TIMEOUT_SECONDS', 600))
+# A running job touches its heartbeat this often, even while a single class is still being built.
+REPORT_HEARTBEAT_SECONDS = REPORT_TIMEOUT_SECONDS / 10
+CSV_COLUMNS = ['id', 'name', 'class_name', 'attendance', 'overallAverage',
+               'lowestSubject', 'highestSubject', 'quizzesTaken', 'marks']
+
+# The Flask app inside a worker process, set up by _init_worker
+_worker_app = None
+# When stale jobs were last reclaimed; checked on a timer, not on every status poll
+_last_reclaim = None
+_reclaim_lock = threading.Lock()
+
+
+def _init_worker():
+    """Runs once in each worker process: loads the app and drops any inherited DB connections."""
+    global _worker_app
+    from app import app
+    _worker_app = app
+    with app.app_context():
+        db.engine.dispose()
+
+
+def build_class_reports(class_id):
+    """Computes report data for every student in a class. Runs inside a worker process."""
+    from app import get_student_details
+
+    with _worker_app.app_context():
+        students = db.session.scalars(
+            db.select(Student)
+            .where(Student.class_id == class_id)
+            .options(selectinload(Student.class_obj), selectinload(Student.archive_summary))
+            .order_by(Student.id)
+        ).all()
+
+        # Count quiz attempts for the whole class in one query instead of one per student
+        quiz_counts = dict(db.session.execute(
+            db.select(QuizAttempt.student_id, db.func.count(QuizAttempt.id))
+            .join(Student, Student.id == QuizAttempt.student_id)
+            .where(Student.class_id == class_id)
+            .group_by(QuizAttempt.student_id)
+        ).all())
+
+        return [get_student_details(s, quizzes_taken=quiz_counts.get(s.id, 0)) for s in students]
+
+
+def _csv_row(report):
+    row = {column: report.get(column) for column in CSV_COLUMNS}
+    row['lowestSubject'] = report['lowestSubject']['subject']
+    row['highestSubject'] = report['highestSubject']['subject']
+    row['marks'] = json.dumps(report.get('marks') or {})
+    return row
+
+
+def _update_job(job_id, **fields):
+    job = db.session.get(ReportJob, job_id)
+    # A job reclaimed as stale stays failed; stop instead of overwriting that
+    if job.status == 'failed' and fields.get('status') != 'failed':
+        raise RuntimeError(job.error)
+    for key, value in fields.items():
+        setattr(job, key, value)
+    db.session.commit()
+    return job
+
+
+def reclaim_stale_report_jobs():
+    """Fails queued or running jobs whose heartbeat stopped, e.g. after a web worker restart.
+
+    Runs at most once every REPORT_HEARTBEAT_SECONDS per process, so status polls stay read-only.
+    """
+    global _last_reclaim
+    now = datetime.datetime.utcnow()
+    with _reclaim_lock:
+        if _last_reclaim is not None and (now - _last_reclaim).total_seconds() < REPORT_HEARTBEAT_SECONDS:
+            return
+        _last_reclaim = now
+
+    cutoff = now - datetime.timedelta(seconds=REPORT_TIMEOUT_SECONDS)
+    db.session.execute(
+        db.update(ReportJob)
+        .where(ReportJob.status.in_(('queued', 'running')), ReportJob.updated_at < cutoff)
+        .values(status='failed', error='Report job stopped responding; please start it again.', finished_at=now)
+    )
+    db.session.commit()
+
+
+def run_report_job(app, job_id):
+    """Fans the job's classes out to a process pool and streams results to the output file."""
+    with app.app_context():
+        job = db.session.get(ReportJob, job_id)
+        output_format = job.output_format
+        output_path = job.output_path
+
+        # Write to a temporary file so a partially written report is never downloadable
+        tmp_path = output_path + '.part'
+        completed = 0
+        processed = 0
+        try:
+            if job.class_id is not None:
+                class_ids = [job.class_id]
+            else:
+                class_ids = db.session.scalars(db.select(Class.id).order_by(Class.id)).all()
+            _update_job(job_id, status='running', total_classes=len(class_ids))
+
+            with open(tmp_path, 'w', newline='') as out:
+                writer = None
+                if output_format == 'csv':
+                    writer = csv.DictWriter(out, fieldnames=CSV_COLUMNS)
+                    writer.writeheader()
+
+                context = multiprocessing.get_context('spawn')
+                workers = max(1, min(REPORT_WORKERS, len(class_ids)))
+                with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                         initializer=_init_worker) as pool:
+                    pending = {pool.submit(build_class_reports, class_id) for class_id in class_ids}
+                    while pending:
+                        done, pending = wait(pending, timeout=REPORT_HEARTBEAT_SECONDS,
+                                             return_when=FIRST_COMPLETED)
+                        if not done:
+                            # Still working on a slow class; keep the heartbeat fresh
+                            _update_job(job_id, updated_at=datetime.datetime.utcnow())
+                            continue
+                        for future in done:
+                            reports = future.result()
+                            for report in reports:
+                                if writer:
+                                    writer.writerow(_csv_row(report))
+                                else:
+                                    out.write(json.dumps(report) + '\n')
+                            out.flush()
+                            completed += 1
+                            processed += len(reports)
+                            _update_job(job_id, completed_classes=completed, students_processed=processed)
+
+            os.replace(tmp_path, output_path)
+            _update_job(job_id, status='succeeded', finished_at=datetime.datetime.utcnow())
+        except Exception as e:
+            app.logger.error(f"Report job {job_id} failed: {e}")
+            db.session.rollback()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            _update_job(job_id, status='failed', error=str(e), finished_at=datetime.datetime.utcnow())
+
+
+def start_report_job(app, class_id=None, output_format='jsonl'):
+    """Creates a ReportJob and runs it on a background thread. Returns the job immediately."""
+    reports_dir = os.path.join(app.instance_path, 'reports')
+    os.makedirs(reports_dir, exist_ok=True)
+    reclaim_stale_report_jobs()
+
+    job_id = uuid.uuid4().hex
+    job = ReportJob(
+        id=job_id,
+        class_id=class_id,
+        output_format=output_format,
+        status='queued',
+        output_path=os.path.join(reports_dir, f"{job_id}.{output_format}")
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    threading.Thread(target=run_report_job, args=(app, job_id), daemon=True).start()
+    return job
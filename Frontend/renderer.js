@@ -43,8 +43,29 @@ let quizStartTime = null;
 
 // --- API & Helper Functions ---
 
+async function waitForJob(jobId, intervalMs = 1000, timeoutMs = 180000) {
+    // Polls a background job until it has either succeeded or failed, giving up after timeoutMs.
+    // The default outlasts the server's retry budget for AI calls (about 150 s, see app.py).
+    const deadline = Date.now() + timeoutMs;
+    while (true) {
+        if (Date.now() > deadline) {
+            showToast('The server is taking too long to process this request. Please try again later.', 'error');
+            throw new Error('Timed out waiting for the background job to finish.');
+        }
+        const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`);
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.message || `Job lookup failed: ${response.status}`);
+        }
+        if (data.job.status === 'succeeded' || data.job.status === 'failed') {
+            return data.job;
+        }
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+}
+
 async function callGeminiApi(prompt) {
-    // This function now calls our secure backend proxy
+    // This function now calls our secure backend proxy, which queues the request as a job
     try {
         const response = await fetch(`${API_BASE_URL}/gemini-proxy`, {
             method: 'POST',
@@ -52,18 +73,23 @@ async function callGeminiApi(prompt) {
             body: JSON.stringify({ prompt: prompt })
         });
 
-        if (!response.ok) {
-            const errorData = await response.json();
+        let job = null;
+        if (response.ok) {
+            job = await waitForJob((await response.json()).job.id);
+        }
+
+        if (!response.ok || job.status === 'failed') {
+            const errorData = job ? (job.result || { error: job.error }) : await response.json();
             console.error("API Proxy Error:", errorData);
             const errorMessage = errorData.details?.error?.message || 'Unknown AI service error.';
             if (errorMessage.includes("API key not valid")) {
                  showToast('Invalid Gemini API Key. Please update it in the backend .env file.', 'error');
                  return "Error: The Gemini API key configured on the server is not valid.";
             }
-            throw new Error(`API Error: ${response.status} - ${errorMessage}`);
+            throw new Error(`API Error: ${job ? job.error : response.status} - ${errorMessage}`);
         }
 
-        const result = await response.json();
+        const result = job.result;
         
         if (result.candidates && result.candidates[0]?.content?.parts[0]) {
             return result.candidates[0].content.parts[0].text;
@@ -934,7 +960,7 @@ async function loadQuizHistory() {
     container.innerHTML = '<div class="spinner-dark"></div>';
     
     try {
-        const response = await fetch(`${API_BASE_URL}/student/quiz/history/${currentLoggedInUser.id}`);
+        const response = await fetch(`${API_BASE_URL}/student/quiz/history/${currentLoggedInUser.id}?include_archived=true`);
         const result = await response.json();
         
         if (result.success && result.history.length > 0) {
@@ -1067,7 +1093,7 @@ async function renderParentComplaints() {
     container.innerHTML = '<div class="spinner"></div>';
 
     try {
-        const response = await fetch(`${API_BASE_URL}/parent/complaints/${currentLoggedInUser.id}`);
+        const response = await fetch(`${API_BASE_URL}/parent/complaints/${currentLoggedInUser.id}?include_archived=true`);
         const result = await response.json();
 
         if (response.ok && result.success) {
@@ -1186,8 +1212,14 @@ async function handleSendComplaint() {
 
         const result = await response.json();
         if (response.ok && result.success) {
-            showToast('Complaint sent successfully!', 'success');
+            showToast(result.message || 'Complaint queued.', 'success');
             document.getElementById('complaint-modal').classList.add('hidden');
+            // The report snapshot is built in the background; tell the teacher if that fails
+            waitForJob(result.job.id).then(job => {
+                if (job.status === 'failed') {
+                    showToast(`The complaint could not be delivered: ${job.error}`, 'error');
+                }
+            }).catch(error => console.error("Complaint job tracking failed:", error));
         } else {
             showToast(result.message || 'Could not send complaint.', 'error');
         }